@@ -26,5 +26,16 @@ MONITOR_CONFIG = {
     
     # 页面加载超时时间（秒）
     "page_timeout": 60,
+    
+    # 单次浏览器抓取的最长时间（秒），超时后强制结束抓取进程及浏览器
+    "scrape_timeout": 90,
+    
+    # Segment Finance 数据接口 URL（可在浏览器开发者工具 Network 面板中找到）
+    # 配置后直接请求 JSON 接口，无需启动浏览器；失败时自动回退到 Playwright 抓取
+    # None = 始终使用 Playwright 抓取页面
+    "api_url": None,
+    
+    # 数据接口的 POST 请求体（如 GraphQL 查询），None = 使用 GET 请求
+    "api_payload": None,
 }
 
@@ -5,14 +5,31 @@ satUSD Liquidity 监控程序
 
 使用方法：
   python monitor.py test      # 测试连接
+  python monitor.py test --no-browser  # 测试连接（不启动浏览器，CI=true 时默认启用）
   python monitor.py once      # 执行一次检查
   python monitor.py run       # 持续运行监控
 """
 
+import os
 import re
+import json
+import math
 import time
+import atexit
+import signal
+import asyncio
+import threading
+import multiprocessing
+import orjson
+import hashlib
+import tempfile
 import requests
 import traceback
+from pathlib import Path
+from collections import deque
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
 
@@ -22,6 +39,287 @@ from config import (
     MONITOR_CONFIG,
 )
 
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 预编译的正则表达式
+_RE_NUM = re.compile(r'[\d.]+')
+_RE_DOLLAR_CELL = re.compile(r'\$\d')
+
+# 数值后缀对应的倍数
+_SUFFIX_MULTIPLIERS = {'K': 1e3, 'M': 1e6, 'B': 1e9}
+
+# 在浏览器内从 satUSD-v1 行提取 liquidity，一次调用返回结果
+# 数字部分使用显式的可选小数和有上限的量词，避免长文本上的回溯
+EXTRACT_LIQUIDITY_SCRIPT = r"""
+row => {
+    const text = row.innerText;
+    const result = {text: text.slice(0, 100), liquidity: null, dollars: []};
+
+    // 方法1: 匹配 "X.XX satUSD-v1" 和下面的 "$X.XX"
+    const match = text.match(/(\d+(?:\.\d+)?)\s+satUSD-v1\s+\$(\d+(?:\.\d+)?)/);
+    if (match) {
+        result.liquidity = parseFloat(match[2]);
+        return result;
+    }
+
+    // 方法2: 查找所有美元值，倒数第二个为 liquidity
+    result.dollars = [...text.matchAll(/\$(\d{1,12}(?:\.\d{1,4})?)/g)].map(m => m[1]);
+    if (result.dollars.length >= 2) {
+        result.liquidity = parseFloat(result.dollars[result.dollars.length - 2]);
+    }
+    return result;
+}
+"""
+
+# Telegram 消息模板
+_ALERT_TMPL = (
+    "🔔 <b>satUSD Liquidity 告警</b>\n\n"
+    "📊 资产: {asset}\n"
+    "💰 当前 Liquidity: <b>${liq:.2f}</b>\n"
+    "📈 触发阈值: ${threshold}\n"
+    "🔗 <a href='{url}'>查看详情</a>\n"
+    "\n⏰ 检查时间: {ts:%Y-%m-%d %H:%M:%S}"
+)
+_FAILURE_TMPL = (
+    "⚠️ <b>satUSD 监控异常</b>\n\n"
+    "❌ 连续 {failures} 次获取数据失败\n"
+    "📍 监控目标: {asset}\n"
+    "🔗 <a href='{url}'>手动检查</a>\n"
+    "{last_success}"
+    "\n⏰ 当前时间: {ts:%Y-%m-%d %H:%M:%S}"
+)
+_HEARTBEAT_TMPL = (
+    "💚 <b>satUSD 监控心跳</b>\n\n"
+    "✅ 监控程序运行正常\n"
+    "📊 监控目标: {asset}\n"
+    "⏱️ 检查间隔: {interval_min} 分钟\n"
+    "📈 触发阈值: ${threshold}\n"
+    "{last_success}"
+    "\n⏰ 当前时间: {ts:%Y-%m-%d %H:%M:%S}"
+)
+_STARTUP_TMPL = (
+    "🚀 <b>satUSD 监控已启动</b>\n\n"
+    "📊 监控目标: {asset}\n"
+    "⏱️ 检查间隔: {interval_min} 分钟\n"
+    "📈 触发阈值: ${threshold}\n"
+    "\n⏰ 启动时间: {ts:%Y-%m-%d %H:%M:%S}"
+)
+
+# Telegram 发送队列：两条消息的最小间隔（秒，单聊天限制约 1 条/秒）、同类告警的合并窗口（秒）
+TELEGRAM_MIN_INTERVAL = 1.1
+TELEGRAM_COALESCE_WINDOW = 300
+# 429 响应中的等待时间无法解析时使用的默认值（秒）
+TELEGRAM_DEFAULT_RETRY_AFTER = 5
+
+# 调试页面保存限制：最短间隔（秒）、最大字符数、保留份数
+DEBUG_PAGE_MIN_INTERVAL = 3600
+DEBUG_PAGE_MAX_CHARS = 256 * 1024
+DEBUG_PAGE_KEEP = 3
+
+# 无头抓取用不到的 Chromium 功能，关闭以加快启动并减少内存占用
+CHROMIUM_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-translate",
+    "--no-first-run",
+    "--no-zygote",
+    "--disable-features=Translate,BackForwardCache,AcceptCHFrame",
+    "--mute-audio",
+    "--hide-scrollbars",
+]
+
+# 浏览器抓取时拦截的资源类型和统计/广告域名，这些请求与 liquidity 数据无关
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'media', 'stylesheet'}
+BLOCKED_URL_KEYWORDS = ('google-analytics', 'googletagmanager', 'segment.io', 'hotjar', 'doubleclick')
+
+# 关闭页面动画和过渡效果
+DISABLE_ANIMATIONS_SCRIPT = """
+document.addEventListener('DOMContentLoaded', () => {
+    const style = document.createElement('style');
+    style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; }';
+    document.head.appendChild(style);
+});
+"""
+
+# 运行状态文件，重启后恢复阈值状态、失败计数和心跳时间
+STATE_PATH = Path.home() / '.satusd_state.json'
+
+# 数据接口响应缓存（ETag / Last-Modified），用于条件请求
+HTTP_CACHE_PATH = Path.home() / '.cache' / 'satusd' / 'cache.json'
+
+# 浏览器抓取子进程使用 spawn 启动，避免 fork 带有后台线程的主进程
+_mp = multiprocessing.get_context('spawn')
+
+# 直接请求数据接口时复用的 HTTP 会话（keep-alive + gzip）
+_session = requests.Session()
+_session.headers.update({
+    'User-Agent': USER_AGENT,
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+})
+
+
+def log(msg):
+    """打印带时间戳的日志"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] {msg}", flush=True)
+
+
+class PageScraper:
+    """使用 Playwright 抓取页面上 satUSD-v1 的 liquidity，每个实例在独立子进程中只抓取一次"""
+    
+    def __init__(self, config, debug=False):
+        self.config = config
+        self.debug = debug
+        self._pw = None
+        self._browser = None
+    
+    def _route_filter(self, route):
+        """拦截图片、字体、样式等无关资源和统计脚本，加快页面加载"""
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or any(k in request.url for k in BLOCKED_URL_KEYWORDS):
+            route.abort()
+        else:
+            route.continue_()
+    
+    def close(self):
+        """释放浏览器和 Playwright 资源"""
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._pw is not None:
+            try:
+                self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+    
+    def _save_debug_page(self, page):
+        """
+        保存页面内容用于调试
+        限制保存频率和文件大小，只保留最近的几份
+        """
+        saved = sorted(Path('.').glob('debug_page_*.html'))
+        if saved and time.time() - saved[-1].stat().st_mtime < DEBUG_PAGE_MIN_INTERVAL:
+            log("未能从页面提取数据（距上次保存调试页面不足 1 小时，跳过保存）")
+            return
+        
+        log("未能从页面提取数据，保存调试信息...")
+        try:
+            page_content = page.content()[:DEBUG_PAGE_MAX_CHARS]
+            filename = f"debug_page_{datetime.now():%Y%m%d_%H%M%S}.html"
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(page_content)
+            log(f"页面内容已保存到 {filename}")
+            
+            # 只保留最近的 DEBUG_PAGE_KEEP 份
+            for old in sorted(Path('.').glob('debug_page_*.html'))[:-DEBUG_PAGE_KEEP]:
+                old.unlink()
+        except Exception as save_err:
+            log(f"保存调试文件失败: {save_err}")
+    
+    def scrape(self):
+        """
+        抓取一次页面
+        返回 (liquidity, 错误信息)，成功时错误信息为 None
+        """
+        page = None
+        try:
+            log("启动浏览器...")
+            self._pw = sync_playwright().start()
+            # 使用 headless 模式
+            self._browser = self._pw.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            context = self._browser.new_context(
+                viewport={'width': 1280, 'height': 720},
+                user_agent=USER_AGENT
+            )
+            context.route('**/*', self._route_filter)
+            context.add_init_script(DISABLE_ANIMATIONS_SCRIPT)
+            
+            log("打开页面获取数据...")
+            page = context.new_page()
+            
+            # 设置默认超时
+            page.set_default_timeout(self.config['page_timeout'] * 1000)
+            
+            # 访问页面，DOM 就绪即可，不等待 networkidle
+            log(f"访问 {self.config['url']}...")
+            page.goto(self.config['url'], wait_until='domcontentloaded', timeout=self.config['page_timeout'] * 1000)
+            
+            # 等待 satUSD-v1 所在行渲染出美元数值
+            log("等待页面数据加载...")
+            # 在浏览器端按文本过滤出目标行，避免逐行读取文本
+            row = page.locator('tr:has-text("satUSD-v1"), [role="row"]:has-text("satUSD-v1")').first
+            row.locator('td, [role="cell"]').filter(has_text=_RE_DOLLAR_CELL).first.wait_for(timeout=15000)
+            
+            result = row.evaluate(EXTRACT_LIQUIDITY_SCRIPT)
+            log(f"找到 satUSD-v1 行: {result['text']}...")
+            
+            # 调试模式下一次性读取所有单元格文本
+            if self.debug:
+                cell_texts = row.locator('td, [role="cell"], .MuiTableCell-root').all_inner_texts()
+                for i, cell_text in enumerate(cell_texts):
+                    log(f"  单元格 {i}: {cell_text}")
+            
+            if result['dollars']:
+                log(f"找到的美元值: {result['dollars']}")
+            if result['liquidity'] is not None:
+                log(f"提取到 liquidity: ${result['liquidity']}")
+                return result['liquidity'], None
+            
+            # 未找到数据，调试模式下保存页面
+            if self.debug:
+                self._save_debug_page(page)
+            else:
+                log("未能从页面提取数据（设置 SATUSD_DEBUG=1 可保存页面用于调试）")
+            
+            return None, "未能从页面提取 liquidity 数据"
+            
+        except PlaywrightTimeout as e:
+            return None, f"页面加载超时: {e}"
+        except Exception as e:
+            log(f"详细错误: {traceback.format_exc()}")
+            return None, f"获取页面数据失败: {e}"
+        finally:
+            if page is not None:
+                try:
+                    page.close()
+                except Exception:
+                    pass
+
+
+def _scrape_worker(conn, config, debug):
+    """子进程入口：抓取一次页面，通过 Pipe 返回 (liquidity, 错误信息)"""
+    # 独立进程组，超时时可以连同浏览器进程一起结束
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    
+    scraper = PageScraper(config, debug)
+    try:
+        conn.send(scraper.scrape())
+    finally:
+        scraper.close()
+        conn.close()
+
+
+def _kill_process_tree(process):
+    """强制结束子进程及其启动的浏览器进程"""
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
+    process.join()
+
 
 class SatUSDMonitor:
     """satUSD Liquidity 监控类"""
@@ -36,11 +334,93 @@ class SatUSDMonitor:
         self.last_success_time = None  # 上次成功获取数据的时间
         self.max_failures_before_alert = 3  # 连续失败多少次后发送告警
         self.heartbeat_interval_hours = 72  # 心跳间隔（小时，3天）
+        self._load_state()
+        self.debug = os.environ.get('SATUSD_DEBUG') == '1'  # 调试模式：输出单元格内容并保存页面
+        self._http_cache = self._load_http_cache()  # {url: {etag, last_modified, body}}
+        self._last_api_digest = None  # 上次接口响应内容的哈希
+        self._last_api_liquidity = None  # 上次接口响应解析出的 liquidity
+        # 消息模板中不随时间变化的字段
+        self._ctx = {
+            "asset": self.config['asset_name'],
+            "threshold": self.config['liquidity_threshold'],
+            "url": self.config['url'],
+            "interval_min": self.config['check_interval'] // 60,
+        }
+        # Telegram 请求复用连接，由 urllib3 负责 5xx 重试；429 交给发送队列按 retry_after 处理
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=2,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=[500, 502, 503, 504],
+                allowed_methods=frozenset({"POST"}),
+                raise_on_status=False,  # 重试用尽后返回最后的响应
+            ),
+        ))
+        # 告警消息发送队列，由后台线程按频率限制发送
+        self._tg_queue = deque()  # 待发送的消息
+        self._tg_cond = threading.Condition()
+        self._tg_sender = None  # 后台发送线程（按需启动）
+        self._tg_busy = False  # 后台线程是否正在发送消息
+        self._tg_last_send = 0.0  # 上次发送时间（monotonic）
+        self._tg_coalesce = {}  # {合并键: 上次入队时间}
+        self._inflight = {}  # 正在进行的获取任务 {资产名: Future}，用于合并并发请求
+        self._inflight_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)  # 持续运行时执行检查的线程
+        self._stop = threading.Event()  # 程序退出标志，用于中断正在进行的检查
+        atexit.register(self.flush_telegram_queue)
         
     def log(self, msg):
         """打印带时间戳的日志"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{timestamp}] {msg}", flush=True)
+        log(msg)
+    
+    def _load_state(self):
+        """从状态文件恢复上次运行的状态，文件损坏时使用默认值"""
+        try:
+            state = json.loads(STATE_PATH.read_text(encoding='utf-8'))
+            if not isinstance(state, dict):
+                raise ValueError("内容不是 JSON 对象")
+            
+            above = state.get('last_state_above_threshold')
+            if above is not None and not isinstance(above, bool):
+                raise ValueError(f"last_state_above_threshold 无效: {above!r}")
+            failures = state.get('consecutive_failures', 0)
+            if isinstance(failures, bool) or not isinstance(failures, int) or failures < 0:
+                raise ValueError(f"consecutive_failures 无效: {failures!r}")
+            last_heartbeat = state.get('last_heartbeat')
+            if last_heartbeat is not None:
+                last_heartbeat = datetime.fromisoformat(last_heartbeat)
+            last_success_time = state.get('last_success_time')
+            if last_success_time is not None:
+                last_success_time = datetime.fromisoformat(last_success_time)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError) as e:
+            self.log(f"读取状态文件失败，使用默认状态: {e}")
+            return
+        
+        self.last_state_above_threshold = above
+        self.consecutive_failures = failures
+        self.last_heartbeat = last_heartbeat
+        self.last_success_time = last_success_time
+    
+    def _save_state(self):
+        """原子写入状态文件（先写临时文件再替换）"""
+        state = {
+            'last_state_above_threshold': self.last_state_above_threshold,
+            'consecutive_failures': self.consecutive_failures,
+            'last_heartbeat': self.last_heartbeat.isoformat() if self.last_heartbeat else None,
+            'last_success_time': self.last_success_time.isoformat() if self.last_success_time else None,
+        }
+        try:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=STATE_PATH.parent,
+                                             prefix=STATE_PATH.name, delete=False) as f:
+                json.dump(state, f)
+            os.replace(f.name, STATE_PATH)
+        except OSError as e:
+            self.log(f"保存状态文件失败: {e}")
     
     def parse_liquidity_value(self, text):
         """
@@ -55,21 +435,26 @@ class SatUSDMonitor:
         
         # 移除货币符号和空格
         text = text.replace('$', '').replace(',', '').strip()
+        if not text:
+            return None
         
         # 处理 K/M/B 后缀
-        multiplier = 1
-        if text.endswith('K') or text.endswith('k'):
-            multiplier = 1000
-            text = text[:-1]
-        elif text.endswith('M') or text.endswith('m'):
-            multiplier = 1000000
-            text = text[:-1]
-        elif text.endswith('B') or text.endswith('b'):
-            multiplier = 1000000000
+        multiplier = _SUFFIX_MULTIPLIERS.get(text[-1].upper(), 1)
+        if multiplier != 1:
             text = text[:-1]
         
+        # 常见情况已是纯数字，直接转换（排除 nan/inf 和带下划线的写法）
+        if '_' not in text:
+            try:
+                value = float(text)
+            except ValueError:
+                pass
+            else:
+                if math.isfinite(value):
+                    return value * multiplier
+        
         # 提取数字部分
-        match = re.search(r'[\d.]+', text)
+        match = _RE_NUM.search(text)
         if match:
             try:
                 return float(match.group()) * multiplier
@@ -77,111 +462,233 @@ class SatUSDMonitor:
                 return None
         return None
     
-    def get_liquidity_from_page(self, retry_count=3):
+    def find_asset_liquidity(self, data):
+        """在接口返回的 JSON 中查找目标资产 (assetName) 的 liquidityUSD"""
+        if isinstance(data, dict):
+            if data.get('assetName') == self.config['asset_name']:
+                return self.parse_liquidity_value(str(data.get('liquidityUSD', '')))
+            items = data.values()
+        elif isinstance(data, list):
+            items = data
+        else:
+            return None
+        
+        for item in items:
+            value = self.find_asset_liquidity(item)
+            if value is not None:
+                return value
+        return None
+    
+    def _load_http_cache(self):
+        """读取磁盘上的接口响应缓存，文件损坏时返回空缓存"""
+        try:
+            cache = json.loads(HTTP_CACHE_PATH.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+    
+    def _save_http_cache(self):
+        """原子写入接口响应缓存（先写临时文件再替换）"""
+        try:
+            HTTP_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=HTTP_CACHE_PATH.parent,
+                                             prefix=HTTP_CACHE_PATH.name, delete=False) as f:
+                json.dump(self._http_cache, f, ensure_ascii=False)
+            os.replace(f.name, HTTP_CACHE_PATH)
+        except OSError as e:
+            self.log(f"保存接口缓存失败: {e}")
+    
+    def fetch_api_body(self, api_url, api_payload=None):
+        """
+        请求数据接口并返回响应内容（bytes）
+        带上缓存的 ETag / Last-Modified 发送条件请求，304 时直接使用缓存内容
+        """
+        cached = self._http_cache.get(api_url)
+        # 缓存条目格式不对时视为未命中，不发送条件请求
+        if not isinstance(cached, dict) or not isinstance(cached.get('body'), str):
+            cached = None
+        
+        headers = {}
+        if cached:
+            if isinstance(cached.get('etag'), str):
+                headers['If-None-Match'] = cached['etag']
+            if isinstance(cached.get('last_modified'), str):
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        if api_payload is not None:
+            headers['Content-Type'] = 'application/json'
+            response = _session.post(api_url, data=orjson.dumps(api_payload), headers=headers, timeout=10)
+        else:
+            response = _session.get(api_url, headers=headers, timeout=10)
+        
+        if response.status_code == 304 and cached:
+            self.log("接口数据未变化 (304)，使用缓存内容")
+            return cached['body'].encode('utf-8')
+        
+        response.raise_for_status()
+        body = response.content
+        
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            try:
+                self._http_cache[api_url] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'body': body.decode('utf-8'),
+                }
+                self._save_http_cache()
+            except UnicodeDecodeError:
+                self.log("接口响应不是 UTF-8 编码，不写入缓存")
+        return body
+    
+    def get_liquidity_from_api(self, retry_count=3):
+        """
+        直接请求 Segment Finance 的数据接口获取 liquidity 值，无需启动浏览器
+        接口地址由 MONITOR_CONFIG['api_url'] 配置，配置了 api_payload 时使用 POST
+        """
+        api_url = self.config['api_url']
+        api_payload = self.config.get('api_payload')
+        last_error = None
+        
+        for attempt in range(retry_count):
+            if attempt > 0:
+                self.log(f"第 {attempt + 1} 次重试...")
+                if self._stop.wait(5):  # 重试前等待，收到退出信号时立即停止
+                    break
+            
+            try:
+                self.log(f"请求数据接口 {api_url}...")
+                body = self.fetch_api_body(api_url, api_payload)
+                
+                # 内容与上次相同时直接复用上次的解析结果
+                digest = hashlib.sha256(body).hexdigest()
+                if digest == self._last_api_digest and self._last_api_liquidity is not None:
+                    self.log(f"接口数据与上次相同，liquidity: ${self._last_api_liquidity}")
+                    return self._last_api_liquidity
+                
+                liquidity = self.find_asset_liquidity(orjson.loads(body))
+                if liquidity is not None:
+                    self._last_api_digest = digest
+                    self._last_api_liquidity = liquidity
+                    self.log(f"提取到 liquidity: ${liquidity}")
+                    return liquidity
+                
+                last_error = f"接口返回数据中未找到 {self.config['asset_name']}"
+                self.log(f"[错误] {last_error}")
+            except (requests.RequestException, ValueError) as e:
+                last_error = f"请求数据接口失败: {e}"
+                self.log(f"[错误] {last_error}")
+        
+        self.log(f"[错误] 重试 {retry_count} 次后仍然失败: {last_error}")
+        return None
+    
+    def get_liquidity_from_page(self, retry_count=3, use_browser=False):
+        """
+        获取 satUSD-v1 的 liquidity 值
+        同一资产同时只执行一次获取，并发的调用等待并共享同一个结果
+        """
+        key = self.config['asset_name']
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+        
+        if not is_leader:
+            self.log("已有相同的获取任务在执行，等待其结果...")
+            return future.result()
+        
+        try:
+            liquidity = self._fetch_liquidity(retry_count=retry_count, use_browser=use_browser)
+            future.set_result(liquidity)
+            return liquidity
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    def _fetch_liquidity(self, retry_count=3, use_browser=False):
+        """
+        配置了 api_url 时优先直接请求数据接口，失败或 use_browser=True 时使用 Playwright 抓取页面
+        """
+        if not use_browser and self.config.get('api_url'):
+            liquidity = self.get_liquidity_from_api(retry_count=retry_count)
+            if liquidity is not None:
+                return liquidity
+            if self._stop.is_set():
+                return None
+            self.log("数据接口获取失败，回退到浏览器抓取...")
+        
+        return self.get_liquidity_from_browser(retry_count=retry_count)
+    
+    def _wait_for_result(self, conn, timeout):
+        """等待抓取子进程返回结果，超时或收到退出信号时返回 False"""
+        deadline = time.monotonic() + timeout
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if conn.poll(min(remaining, 0.5)):
+                return True
+        return False
+    
+    def get_liquidity_from_browser(self, retry_count=3):
         """
         使用 Playwright 从网页获取 satUSD-v1 的 liquidity 值
+        每次抓取在独立子进程中进行，超过 scrape_timeout 未完成时强制结束
         支持重试机制
         """
+        timeout = self.config.get('scrape_timeout', self.config['page_timeout'] + 30)
         last_error = None
         
         for attempt in range(retry_count):
             if attempt > 0:
                 self.log(f"第 {attempt + 1} 次重试...")
-                time.sleep(5)  # 重试前等待
+                if self._stop.wait(5):  # 重试前等待，收到退出信号时立即停止
+                    break
+            
+            parent_conn, child_conn = _mp.Pipe(duplex=False)
+            process = _mp.Process(target=_scrape_worker, args=(child_conn, self.config, self.debug), daemon=True)
+            process.start()
+            child_conn.close()
             
-            browser = None
             try:
-                self.log("启动浏览器获取页面数据...")
+                if not self._wait_for_result(parent_conn, timeout):
+                    _kill_process_tree(process)
+                    if self._stop.is_set():
+                        last_error = "程序正在退出，已结束页面抓取"
+                        self.log(last_error)
+                        break
+                    last_error = f"页面抓取超过 {timeout} 秒未完成，已强制结束"
+                    self.log(f"[错误] {last_error}")
+                    continue
                 
-                with sync_playwright() as p:
-                    # 使用 headless 模式
-                    browser = p.chromium.launch(headless=True)
-                    context = browser.new_context(
-                        viewport={'width': 1920, 'height': 1080},
-                        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    )
-                    page = context.new_page()
-                    
-                    # 设置默认超时
-                    page.set_default_timeout(self.config['page_timeout'] * 1000)
-                    
-                    # 访问页面
-                    self.log(f"访问 {self.config['url']}...")
-                    page.goto(self.config['url'], wait_until='networkidle', timeout=self.config['page_timeout'] * 1000)
-                    
-                    # 等待页面加载完成 - 等待资产表格出现
-                    self.log("等待页面数据加载...")
-                    page.wait_for_selector('text=satUSD-v1', timeout=30000)
-                    
-                    # 额外等待确保数据完全加载
-                    time.sleep(3)
-                    
-                    # 查找 satUSD-v1 所在的行
-                    rows = page.query_selector_all('tr, [role="row"], .MuiTableRow-root')
-                    
-                    for row in rows:
-                        row_text = row.inner_text()
-                        if 'satUSD-v1' in row_text:
-                            self.log(f"找到 satUSD-v1 行: {row_text[:100]}...")
-                            
-                            # 遍历单元格获取信息
-                            cells = row.query_selector_all('td, [role="cell"], .MuiTableCell-root')
-                            for i, cell in enumerate(cells):
-                                cell_text = cell.inner_text()
-                                self.log(f"  单元格 {i}: {cell_text}")
-                            
-                            # 从完整行文本中提取 liquidity 值
-                            # 方法1: 匹配 "X.XX satUSD-v1" 和下面的 "$X.XX"
-                            liquidity_match = re.search(r'([\d.]+)\s*satUSD-v1\s*\$?([\d.]+)', row_text)
-                            if liquidity_match:
-                                usd_value = float(liquidity_match.group(2))
-                                self.log(f"提取到 liquidity: ${usd_value}")
-                                browser.close()
-                                return usd_value
-                            
-                            # 方法2: 查找所有美元值
-                            numbers = re.findall(r'\$([\d.]+)', row_text)
-                            if numbers:
-                                self.log(f"找到的美元值: {numbers}")
-                                if len(numbers) >= 2:
-                                    liquidity = float(numbers[-2])
-                                    self.log(f"推测 liquidity: ${liquidity}")
-                                    browser.close()
-                                    return liquidity
-                    
-                    # 未找到数据，保存页面用于调试
-                    self.log("未能从页面提取数据，保存调试信息...")
-                    try:
-                        page_content = page.content()
-                        with open('debug_page.html', 'w', encoding='utf-8') as f:
-                            f.write(page_content)
-                        self.log("页面内容已保存到 debug_page.html")
-                    except Exception as save_err:
-                        self.log(f"保存调试文件失败: {save_err}")
-                    
-                    browser.close()
-                    last_error = "未能从页面提取 liquidity 数据"
-                    
-            except PlaywrightTimeout as e:
-                last_error = f"页面加载超时: {e}"
+                liquidity, last_error = parent_conn.recv()
+                if liquidity is not None:
+                    return liquidity
                 self.log(f"[错误] {last_error}")
-            except Exception as e:
-                last_error = f"获取页面数据失败: {e}"
+            except EOFError:
+                last_error = f"抓取子进程异常退出 (exitcode={process.exitcode})"
                 self.log(f"[错误] {last_error}")
-                self.log(f"详细错误: {traceback.format_exc()}")
             finally:
-                # 确保浏览器被关闭
-                if browser:
-                    try:
-                        browser.close()
-                    except:
-                        pass
+                parent_conn.close()
+                # 给子进程留出关闭浏览器的时间，仍未退出则强制结束
+                process.join(10)
+                if process.is_alive():
+                    _kill_process_tree(process)
         
         self.log(f"[错误] 重试 {retry_count} 次后仍然失败: {last_error}")
         return None
     
-    def send_telegram_message(self, message, retry_count=3):
-        """发送 Telegram 消息，支持重试"""
+    def _post_telegram(self, message):
+        """
+        调用 sendMessage 接口，失败时由连接池的重试策略自动重试
+        返回 (是否成功, 被限流时需要等待的秒数)
+        """
         url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
         payload = {
             "chat_id": self.chat_id,
@@ -189,40 +696,114 @@ class SatUSDMonitor:
             "parse_mode": "HTML"
         }
         
-        for attempt in range(retry_count):
-            try:
-                response = requests.post(url, json=payload, timeout=15)
-                response.raise_for_status()
-                self.log("[成功] Telegram 消息已发送")
-                return True
-            except requests.RequestException as e:
-                self.log(f"[错误] Telegram 消息发送失败 (尝试 {attempt + 1}/{retry_count}): {e}")
-                if attempt < retry_count - 1:
-                    time.sleep(2)
+        try:
+            response = self._http.post(url, data=orjson.dumps(payload),
+                                       headers={"Content-Type": "application/json"}, timeout=15)
+            if response.status_code == 429:
+                retry_after = self._parse_retry_after(response)
+                self.log(f"[错误] Telegram 限流，需等待 {retry_after} 秒")
+                return False, retry_after
+            response.raise_for_status()
+            self.log("[成功] Telegram 消息已发送")
+            return True, None
+        except requests.RequestException as e:
+            self.log(f"[错误] Telegram 消息发送失败: {e}")
+            return False, None
+    
+    def _parse_retry_after(self, response):
+        """
+        解析 429 响应需要等待的秒数
+        优先使用 parameters.retry_after，其次 Retry-After 头，都无法解析时使用默认值
+        """
+        try:
+            value = orjson.loads(response.content)['parameters']['retry_after']
+        except (ValueError, KeyError, TypeError):
+            value = response.headers.get('Retry-After')
         
-        return False
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            return TELEGRAM_DEFAULT_RETRY_AFTER
+        if not math.isfinite(seconds) or seconds < 0:
+            return TELEGRAM_DEFAULT_RETRY_AFTER
+        return seconds
+    
+    def send_telegram_message(self, message):
+        """立即发送 Telegram 消息，返回是否成功"""
+        ok, _ = self._post_telegram(message)
+        return ok
+    
+    def queue_telegram_message(self, message, coalesce_key=None):
+        """
+        将消息放入发送队列，由后台线程按频率限制依次发送
+        指定 coalesce_key 时，同一类消息在合并窗口内只发送一次
+        """
+        now = time.monotonic()
+        with self._tg_cond:
+            if coalesce_key is not None:
+                last = self._tg_coalesce.get(coalesce_key)
+                if last is not None and now - last < TELEGRAM_COALESCE_WINDOW:
+                    self.log("同类消息在合并窗口内已发送，跳过")
+                    return
+                self._tg_coalesce[coalesce_key] = now
+            
+            self._tg_queue.append(message)
+            if self._tg_sender is None or not self._tg_sender.is_alive():
+                self._tg_sender = threading.Thread(target=self._telegram_sender, daemon=True)
+                self._tg_sender.start()
+            self._tg_cond.notify_all()
+    
+    def _telegram_sender(self):
+        """后台发送线程：保证发送间隔，被限流时按 retry_after 等待后重发"""
+        while True:
+            with self._tg_cond:
+                while not self._tg_queue:
+                    self._tg_cond.wait()
+                message = self._tg_queue.popleft()
+                self._tg_busy = True
+            
+            try:
+                while True:
+                    wait = self._tg_last_send + TELEGRAM_MIN_INTERVAL - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    try:
+                        _, retry_after = self._post_telegram(message)
+                    except Exception as e:
+                        self.log(f"[错误] Telegram 消息发送出错，已丢弃: {e}")
+                        break
+                    finally:
+                        self._tg_last_send = time.monotonic()
+                    if retry_after is None:
+                        break
+                    time.sleep(retry_after)
+            finally:
+                with self._tg_cond:
+                    self._tg_busy = False
+                    self._tg_cond.notify_all()
+    
+    def flush_telegram_queue(self, timeout=60):
+        """等待发送队列中的消息发送完毕"""
+        with self._tg_cond:
+            self._tg_cond.wait_for(lambda: not self._tg_queue and not self._tg_busy, timeout=timeout)
     
     def format_alert_message(self, liquidity):
         """格式化告警消息"""
-        message = "🔔 <b>satUSD Liquidity 告警</b>\n\n"
-        message += f"📊 资产: {self.config['asset_name']}\n"
-        message += f"💰 当前 Liquidity: <b>${liquidity:.2f}</b>\n"
-        message += f"📈 触发阈值: ${self.config['liquidity_threshold']}\n"
-        message += f"🔗 <a href='{self.config['url']}'>查看详情</a>\n"
-        message += f"\n⏰ 检查时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        return message
+        return _ALERT_TMPL.format_map({**self._ctx, "liq": liquidity, "ts": datetime.now()})
     
     def send_failure_alert(self):
         """发送连续失败告警"""
-        message = "⚠️ <b>satUSD 监控异常</b>\n\n"
-        message += f"❌ 连续 {self.consecutive_failures} 次获取数据失败\n"
-        message += f"📍 监控目标: {self.config['asset_name']}\n"
-        message += f"🔗 <a href='{self.config['url']}'>手动检查</a>\n"
+        last_success = ""
         if self.last_success_time:
-            message += f"\n✅ 上次成功: {self.last_success_time.strftime('%Y-%m-%d %H:%M:%S')}"
-        message += f"\n⏰ 当前时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            last_success = f"\n✅ 上次成功: {self.last_success_time:%Y-%m-%d %H:%M:%S}"
+        message = _FAILURE_TMPL.format_map({
+            **self._ctx,
+            "failures": self.consecutive_failures,
+            "last_success": last_success,
+            "ts": datetime.now(),
+        })
         
-        self.send_telegram_message(message)
+        self.queue_telegram_message(message, coalesce_key='failure')
     
     def send_heartbeat(self):
         """发送心跳消息，证明监控程序仍在运行"""
@@ -232,21 +813,19 @@ class SatUSDMonitor:
         if self.last_heartbeat is None:
             # 首次启动不发送心跳，等待第一个周期
             self.last_heartbeat = now
+            self._save_state()
             return
         
         hours_since_heartbeat = (now - self.last_heartbeat).total_seconds() / 3600
         if hours_since_heartbeat >= self.heartbeat_interval_hours:
-            message = "💚 <b>satUSD 监控心跳</b>\n\n"
-            message += "✅ 监控程序运行正常\n"
-            message += f"📊 监控目标: {self.config['asset_name']}\n"
-            message += f"⏱️ 检查间隔: {self.config['check_interval'] // 60} 分钟\n"
-            message += f"📈 触发阈值: ${self.config['liquidity_threshold']}\n"
+            last_success = ""
             if self.last_success_time:
-                message += f"\n✅ 上次成功获取: {self.last_success_time.strftime('%H:%M:%S')}"
-            message += f"\n⏰ 当前时间: {now.strftime('%Y-%m-%d %H:%M:%S')}"
+                last_success = f"\n✅ 上次成功获取: {self.last_success_time:%H:%M:%S}"
+            message = _HEARTBEAT_TMPL.format_map({**self._ctx, "last_success": last_success, "ts": now})
             
             if self.send_telegram_message(message):
                 self.last_heartbeat = now
+                self._save_state()
                 self.log("心跳消息已发送")
     
     def check_and_notify(self):
@@ -257,6 +836,10 @@ class SatUSDMonitor:
         
         liquidity = self.get_liquidity_from_page(retry_count=3)
         
+        if liquidity is None and self._stop.is_set():
+            self.log("程序正在退出，本次检查不计入失败")
+            return False
+        
         if liquidity is None:
             self.consecutive_failures += 1
             self.log(f"[错误] 无法获取 liquidity 值 (连续失败: {self.consecutive_failures})")
@@ -271,6 +854,7 @@ class SatUSDMonitor:
                     self.log("再次发送失败告警...")
                     self.send_failure_alert()
             
+            self._save_state()
             self.log("=" * 50)
             return False
         
@@ -301,10 +885,11 @@ class SatUSDMonitor:
         if should_notify:
             self.log(f"⚠️ Liquidity ${liquidity:.2f} > ${self.config['liquidity_threshold']}，发送通知...")
             message = self.format_alert_message(liquidity)
-            self.send_telegram_message(message)
+            self.queue_telegram_message(message)
         else:
             self.log(f"✅ Liquidity ${liquidity:.2f} <= ${self.config['liquidity_threshold']}，无需通知")
         
+        self._save_state()
         self.log("=" * 50)
         return True
     
@@ -312,8 +897,8 @@ class SatUSDMonitor:
         """执行一次检查"""
         return self.check_and_notify()
     
-    def run_continuous(self):
-        """持续运行监控"""
+    async def run_continuous(self):
+        """持续运行监控（asyncio 事件循环，任务被取消时正常退出）"""
         self.log("=" * 50)
         self.log("satUSD Liquidity 监控已启动")
         self.log(f"检查间隔: {self.config['check_interval']} 秒 ({self.config['check_interval'] // 60} 分钟)")
@@ -322,36 +907,60 @@ class SatUSDMonitor:
         self.log(f"失败告警阈值: 连续 {self.max_failures_before_alert} 次")
         self.log("=" * 50)
         
-        # 发送启动通知
-        startup_msg = "🚀 <b>satUSD 监控已启动</b>\n\n"
-        startup_msg += f"📊 监控目标: {self.config['asset_name']}\n"
-        startup_msg += f"⏱️ 检查间隔: {self.config['check_interval'] // 60} 分钟\n"
-        startup_msg += f"📈 触发阈值: ${self.config['liquidity_threshold']}\n"
-        startup_msg += f"\n⏰ 启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        self.send_telegram_message(startup_msg)
+        loop = asyncio.get_running_loop()
         
-        while True:
-            try:
-                self.check_and_notify()
-                self.send_heartbeat()
-            except KeyboardInterrupt:
-                self.log("收到中断信号，正在退出...")
-                break
-            except Exception as e:
-                self.log(f"[严重错误] 检查过程出错: {e}")
-                self.log(f"详细错误: {traceback.format_exc()}")
-                self.consecutive_failures += 1
-            
-            self.log(f"下次检查在 {self.config['check_interval']} 秒后...")
-            try:
-                time.sleep(self.config['check_interval'])
-            except KeyboardInterrupt:
-                self.log("收到中断信号，正在退出...")
-                break
+        # 发送启动通知，由后台线程发送，与首次检查并行
+        self.queue_telegram_message(_STARTUP_TMPL.format_map({**self._ctx, "ts": datetime.now()}))
+        
+        interval = self.config['check_interval']
+        next_fire = time.monotonic()
+        
+        try:
+            while True:
+                try:
+                    # 检查在单独的工作线程中串行执行，不阻塞事件循环
+                    await loop.run_in_executor(self._executor, self.check_and_notify)
+                    await asyncio.to_thread(self.send_heartbeat)
+                except Exception as e:
+                    self.log(f"[严重错误] 检查过程出错: {e}")
+                    self.log(f"详细错误: {traceback.format_exc()}")
+                    self.consecutive_failures += 1
+                    self._save_state()
+                
+                # 按固定节奏计算下次检查时间，检查耗时不会累积成漂移
+                next_fire += interval
+                now = time.monotonic()
+                if now - next_fire > interval:
+                    # 落后超过一个周期（如机器休眠），从当前时间重新计时
+                    next_fire = now + interval
+                delay = max(0, next_fire - now)
+                self.log(f"下次检查在 {delay:.0f} 秒后...")
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.log("收到中断信号，正在退出...")
+            # 通知工作线程中的检查尽快结束，否则解释器退出时会等待它完成
+            self._stop.set()
+        finally:
+            self._executor.shutdown(wait=False)
 
 
-def test_connection():
-    """测试各项连接"""
+def run_forever(monitor):
+    """在 asyncio 事件循环中持续运行监控，收到 SIGINT/SIGTERM 时取消任务并退出"""
+    async def main():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        await monitor.run_continuous()
+    
+    asyncio.run(main())
+
+
+def test_connection(no_browser=False):
+    """
+    测试各项连接
+    no_browser=True 时只对页面发送 HEAD 请求检查可达性，不启动浏览器
+    """
     print("=" * 50)
     print("satUSD Liquidity 监控 - 连接测试")
     print("=" * 50)
@@ -360,13 +969,20 @@ def test_connection():
     
     # 测试页面访问
     print("\n1. 测试页面访问...")
-    liquidity = monitor.get_liquidity_from_page(retry_count=2)
-    if liquidity is not None:
-        print(f"   ✅ 页面访问成功")
-        print(f"   当前 satUSD-v1 Liquidity: ${liquidity:.2f}")
+    if no_browser:
+        try:
+            response = _session.head(monitor.config['url'], timeout=5)
+            print(f"   {'✅' if response.ok else '❌'} 页面响应状态码: {response.status_code}")
+        except requests.RequestException as e:
+            print(f"   ❌ 页面访问失败: {e}")
     else:
-        print("   ❌ 页面访问失败或无法提取数据")
-        print("   请检查 debug_page.html 文件分析原因")
+        liquidity = monitor.get_liquidity_from_page(retry_count=2)
+        if liquidity is not None:
+            print(f"   ✅ 页面访问成功")
+            print(f"   当前 satUSD-v1 Liquidity: ${liquidity:.2f}")
+        else:
+            print("   ❌ 页面访问失败或无法提取数据")
+            print("   可设置 SATUSD_DEBUG=1 后重新测试，并检查 debug_page_*.html 文件分析原因")
     
     # 测试 Telegram
     print("\n2. 测试 Telegram...")
@@ -385,16 +1001,19 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         cmd = sys.argv[1].lower()
         if cmd == "test":
-            test_connection()
+            # CI 环境或指定 --no-browser 时跳过浏览器抓取
+            ci = os.environ.get('CI', '').strip().lower() in ('1', 'true', 'yes')
+            test_connection(no_browser='--no-browser' in sys.argv or ci)
         elif cmd == "once":
             monitor = SatUSDMonitor()
             monitor.run_once()
         elif cmd == "run":
             monitor = SatUSDMonitor()
-            monitor.run_continuous()
+            run_forever(monitor)
         else:
             print("用法:")
             print("  python monitor.py test   # 测试连接")
+            print("  python monitor.py test --no-browser   # 测试连接（不启动浏览器）")
             print("  python monitor.py once   # 执行一次检查")
             print("  python monitor.py run    # 持续运行监控")
     else: